@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
+import numpy as np
 import re
+import io
+import warnings
+from lxml import etree
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(page_title="Analisador de Liquidez ETF", layout="wide")
@@ -14,40 +17,108 @@ Faça o upload do arquivo (**XLSX, CSV ou XML**) para começar.
 
 # --- FUNÇÕES AUXILIARES ---
 
-def extract_ticker(col_name):
+_TICKER_RE = re.compile(r'([A-Z]{4}\d{1,2})')
+
+def extract_tickers(columns):
     """
-    Limpa o nome da coluna para pegar apenas o Ticker.
+    Limpa os nomes das colunas para pegar apenas os Tickers (vetorizado).
     """
-    s_col = str(col_name).strip()
-    if s_col.lower() == 'data':
-        return 'Data'
-    match = re.search(r'([A-Z]{4}\d{1,2})', s_col)
-    if match:
-        return match.group(1)
-    return col_name
+    original = pd.Series(columns, dtype=object)
+    if pd.api.types.infer_dtype(original, skipna=False) == 'string':
+        cols = original
+    else:
+        cols = original.astype(str)
+    extracted = cols.str.extract(_TICKER_RE, expand=False)
+    is_data = cols.str.strip().str.lower().eq('data')
+    return extracted.mask(is_data, 'Data').fillna(original).tolist()
 
-@st.cache_data
-def load_data(uploaded_file):
+def _read_xml_stream(file):
+    """
+    Lê o XML em streaming (linha a linha), sem manter a árvore inteira em memória.
+    """
+    cols = {}
+    n_rows = 0
+    depth = 0
+    for event, elem in etree.iterparse(file, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+
+        # Cada filho direto da raiz é uma linha (mesmo critério do pd.read_xml)
+        values = dict(elem.attrib)
+        for child in elem.iterchildren(tag=etree.Element):
+            values[etree.QName(child).localname] = child.text
+        for key, value in values.items():
+            if key not in cols:
+                cols[key] = [None] * n_rows
+            cols[key].append(value)
+        n_rows += 1
+        for col in cols.values():
+            if len(col) < n_rows:
+                col.append(None)
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    df = pd.DataFrame.from_dict(cols)
+    for c in df.columns:
+        try:
+            df[c] = pd.to_numeric(df[c])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+@st.cache_resource
+def _parse_bytes(name, data):
     try:
         df = None
-        file_name = uploaded_file.name.lower()
+        file_name = name.lower()
+        uploaded_file = io.BytesIO(data)
 
         if file_name.endswith('.xlsx'):
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
+            try:
+                df = pd.read_excel(uploaded_file, engine='calamine')
+            except (ImportError, ValueError):
+                uploaded_file.seek(0)
+                df = pd.read_excel(uploaded_file, engine='openpyxl')
         elif file_name.endswith('.csv'):
             try:
-                df = pd.read_csv(uploaded_file)
-            except:
+                df = pd.read_csv(uploaded_file, engine='pyarrow')
+            except Exception:
                 uploaded_file.seek(0)
-                df = pd.read_csv(uploaded_file, sep=';')
+                try:
+                    df = pd.read_csv(uploaded_file)
+                except Exception:
+                    uploaded_file.seek(0)
+                    df = pd.read_csv(uploaded_file, sep=';')
         elif file_name.endswith('.xml'):
-            df = pd.read_xml(uploaded_file)
+            df = _read_xml_stream(uploaded_file)
             
         if df is not None:
-            df.columns = [extract_ticker(c) for c in df.columns]
+            df.columns = extract_tickers(df.columns)
+            dup = df.columns.duplicated()
+            if dup.any():
+                repetidos = ', '.join(map(str, df.columns[dup].unique()))
+                st.warning(f"Colunas com Ticker repetido foram ignoradas (mantida a primeira): {repetidos}")
+                df = df.loc[:, ~dup]
             if 'Data' in df.columns:
-                df['Data'] = pd.to_datetime(df['Data'])
-                df = df.sort_values('Data')
+                if not pd.api.types.is_datetime64_any_dtype(df['Data']):
+                    # ISO (AAAA-MM-DD) primeiro; caso contrário, padrão brasileiro (dia primeiro)
+                    try:
+                        df['Data'] = pd.to_datetime(df['Data'], format='ISO8601')
+                    except (ValueError, TypeError):
+                        df['Data'] = pd.to_datetime(df['Data'], format='mixed', dayfirst=True)
+                if not df['Data'].is_monotonic_increasing:
+                    df = df.sort_values('Data', kind='stable', ignore_index=True)
+                # Placeholders de texto ('nd', '-') viram NaN; colunas sem nenhum número ficam como texto
+                raw = df.drop(columns='Data')
+                num = raw.apply(pd.to_numeric, errors='coerce')
+                keep = (num.notna().any() | raw.isna().all()).to_numpy()
+                df = pd.concat([df[['Data']], num.loc[:, keep].astype('float64'), raw.loc[:, ~keep]], axis=1)
             else:
                 st.error("ERRO: Coluna 'Data' não encontrada.")
                 return None
@@ -57,6 +128,34 @@ def load_data(uploaded_file):
         return None
     return None
 
+def load_data(uploaded_file):
+    """
+    Lê o upload usando nome + bytes como chave, para que os reruns reaproveitem o DataFrame já lido.
+    """
+    return _parse_bytes(uploaded_file.name, uploaded_file.getvalue())
+
+@st.cache_data
+def compute_stats(_df, file_id):
+    """
+    Estatísticas de volume de todos os ativos, indexadas pelo Ticker.
+    O cache é chaveado pelo `file_id` do upload, sem hashear o DataFrame a cada rerun.
+    """
+    num_cols = _df.select_dtypes('number').columns
+    M = _df[num_cols].to_numpy(dtype='float64')
+    if M.shape[0] == 0:
+        # Arquivo só com cabeçalho: mesma tabela de NaN que o pandas devolveria
+        return pd.DataFrame(np.nan, index=num_cols, columns=['mean', 'median', 'std', 'min', 'max'])
+    # Colunas vazias ou com um único valor geram NaN (como no pandas), sem poluir o log
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return pd.DataFrame({
+            'mean': np.nanmean(M, axis=0),
+            'median': np.nanmedian(M, axis=0),
+            'std': np.nanstd(M, axis=0, ddof=1),
+            'min': np.nanmin(M, axis=0),
+            'max': np.nanmax(M, axis=0),
+        }, index=num_cols)
+
 # --- SIDEBAR ---
 
 with st.sidebar:
@@ -68,10 +167,15 @@ with st.sidebar:
 # --- LÓGICA PRINCIPAL ---
 
 if uploaded_file is not None:
+    # Plotly só é importado após o upload (acelera a tela inicial)
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
     df = load_data(uploaded_file)
     
     if df is not None:
-        ativos = [c for c in df.columns if c != 'Data']
+        stats = compute_stats(df, uploaded_file.file_id)
+        ativos = stats.index.tolist()
         
         # --- MODO 1: RAIO-X INDIVIDUAL ---
         if mode == "Raio-X Individual":
@@ -79,13 +183,11 @@ if uploaded_file is not None:
             selected_asset = st.selectbox("Selecione o Ativo:", ativos)
             
             if selected_asset:
-                series = df[selected_asset]
-                
                 # Cálculos
-                media = series.mean()
-                mediana = series.median()
-                vol_max = series.max()
-                vol_min = series.min()
+                media = stats.at[selected_asset, 'mean']
+                mediana = stats.at[selected_asset, 'median']
+                vol_max = stats.at[selected_asset, 'max']
+                vol_min = stats.at[selected_asset, 'min']
                 ratio = media / mediana if mediana > 0 else 0
                 
                 # Display Métricas
@@ -97,42 +199,36 @@ if uploaded_file is not None:
                 
                 st.markdown("---")
                 
-                # Layout de Gráficos (Lado a Lado)
-                g1, g2 = st.columns(2)
-                
-                with g1:
-                    # Gráfico 1: Estrutura
-                    fig_struct = go.Figure()
-                    fig_struct.add_trace(go.Bar(
-                        x=['Média', 'Mediana'],
-                        y=[media, mediana],
-                        text=[f'R$ {media:,.0f}', f'R$ {mediana:,.0f}'],
-                        textposition='auto',
-                        marker_color=['#EF553B', '#00CC96']
-                    ))
-                    fig_struct.update_layout(
-                        title=f"Estrutura: Média vs Mediana ({selected_asset})",
-                        yaxis_title="Volume Financeiro (R$)",
-                        template="plotly_white"
-                    )
-                    st.plotly_chart(fig_struct, use_container_width=True)
-
-                with g2:
-                    # Gráfico 2: Extremos
-                    fig_ext = go.Figure()
-                    fig_ext.add_trace(go.Bar(
-                        x=['Mínimo Dia', 'Máximo Dia'],
-                        y=[vol_min, vol_max],
-                        text=[f'R$ {vol_min:,.0f}', f'R$ {vol_max:,.0f}'],
-                        textposition='auto',
-                        marker_color=['#FFA15A', '#636EFA']
-                    ))
-                    fig_ext.update_layout(
-                        title=f"Stress Test: Pior Dia vs Melhor Dia",
-                        yaxis_title="Volume Financeiro (R$)",
-                        template="plotly_white"
+                # Layout de Gráficos (Lado a Lado, numa única figura)
+                fig_ind = make_subplots(
+                    rows=1, cols=2,
+                    subplot_titles=(
+                        f"Estrutura: Média vs Mediana ({selected_asset})",
+                        "Stress Test: Pior Dia vs Melhor Dia"
                     )
-                    st.plotly_chart(fig_ext, use_container_width=True)
+                )
+
+                # Gráfico 1: Estrutura
+                fig_ind.add_trace(go.Bar(
+                    x=['Média', 'Mediana'],
+                    y=[media, mediana],
+                    text=[f'R$ {media:,.0f}', f'R$ {mediana:,.0f}'],
+                    textposition='auto',
+                    marker_color=['#EF553B', '#00CC96']
+                ), row=1, col=1)
+
+                # Gráfico 2: Extremos
+                fig_ind.add_trace(go.Bar(
+                    x=['Mínimo Dia', 'Máximo Dia'],
+                    y=[vol_min, vol_max],
+                    text=[f'R$ {vol_min:,.0f}', f'R$ {vol_max:,.0f}'],
+                    textposition='auto',
+                    marker_color=['#FFA15A', '#636EFA']
+                ), row=1, col=2)
+
+                fig_ind.update_yaxes(title_text="Volume Financeiro (R$)")
+                fig_ind.update_layout(showlegend=False, template="plotly_white")
+                st.plotly_chart(fig_ind, use_container_width=True)
 
         # --- MODO 2: DUELO ---
         elif mode == "Duelo de Liquidez":
@@ -144,8 +240,9 @@ if uploaded_file is not None:
             
             if a1 and a2 and a1 != a2:
                 # Cálculos
-                m1, m2 = df[a1].mean(), df[a2].mean()
-                med1, med2 = df[a1].median(), df[a2].median()
+                m1, m2 = stats.at[a1, 'mean'], stats.at[a2, 'mean']
+                med1, med2 = stats.at[a1, 'median'], stats.at[a2, 'median']
+                min1, min2 = stats.at[a1, 'min'], stats.at[a2, 'min']
                 ratio1 = m1 / med1 if med1 > 0 else 0
                 ratio2 = m2 / med2 if med2 > 0 else 0
                 
@@ -161,10 +258,10 @@ if uploaded_file is not None:
                 # Tabela Resumo
                 comp_data = {
                     "Métrica": ["Volume Médio", "Volume Mediano", "Razão Média/Mediana", "Pior Dia"],
-                    a1: [f"R$ {m1:,.2f}", f"R$ {med1:,.2f}", f"{ratio1:.2f}x", f"R$ {df[a1].min():,.2f}"],
-                    a2: [f"R$ {m2:,.2f}", f"R$ {med2:,.2f}", f"{ratio2:.2f}x", f"R$ {df[a2].min():,.2f}"]
+                    a1: [f"R$ {m1:,.2f}", f"R$ {med1:,.2f}", f"{ratio1:.2f}x", f"R$ {min1:,.2f}"],
+                    a2: [f"R$ {m2:,.2f}", f"R$ {med2:,.2f}", f"{ratio2:.2f}x", f"R$ {min2:,.2f}"]
                 }
-                st.table(pd.DataFrame(comp_data))
+                st.table(comp_data)
                 
                 # --- GRÁFICOS DO DUELO ---
                 
@@ -205,10 +302,8 @@ if uploaded_file is not None:
                     ))
                     
                     # Linha de Referência (Ideal = 1.0)
-                    fig_ratio.add_shape(
-                        type="line",
-                        x0=-0.5, x1=1.5,
-                        y0=1, y1=1,
+                    fig_ratio.add_hline(
+                        y=1,
                         line=dict(color="Red", width=2, dash="dash"),
                     )
                     